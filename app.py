@@ -1,26 +1,44 @@
 # app.py
-from fastapi import FastAPI, Query
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import HTMLResponse, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import HTMLResponse, Response, StreamingResponse
 from pydantic import BaseModel
-from typing import Dict, List, Optional, Set, Tuple
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple, Union
+import anyio
 import psycopg2
 from psycopg2 import sql
 import re
 from collections import defaultdict
 import csv
+import gzip
+import json
 import io
 import random
+import hashlib
+import heapq
+import os
+import functools
+import zlib
+from snapshot import SnapshotCompartilhado, TabelaBruta
 
 # ====== CREDENCIAIS AWS (SP) ======
-DB_HOST = "bdbarsi.clquwys0y8y8.sa-east-1.rds.amazonaws.com"
-DB_PORT = 5432
-DB_NAME = "postgres"
-DB_USER = "Barsi_admin"
-DB_PASS = "*4482Barsi"
-DB_SSLMODE = "require"
+# (sobrescrevíveis por env, p.ex. para apontar o loadtest.py para um Postgres local)
+DB_HOST = os.environ.get("DB_HOST", "bdbarsi.clquwys0y8y8.sa-east-1.rds.amazonaws.com")
+DB_PORT = int(os.environ.get("DB_PORT", "5432"))
+DB_NAME = os.environ.get("DB_NAME", "postgres")
+DB_USER = os.environ.get("DB_USER", "Barsi_admin")
+DB_PASS = os.environ.get("DB_PASS", "*4482Barsi")
+DB_SSLMODE = os.environ.get("DB_SSLMODE", "require")
 
 SCHEMA = "public"
+CACHE_TTL_S = int(os.environ.get("CACHE_TTL_S", "300"))  # idade máxima do snapshot antes de um worker reconstruí-lo
+THREADPOOL_SIZE = int(os.environ.get("THREADPOOL_SIZE", "0"))  # threads p/ handlers síncronos (0 = padrão do anyio, 40)
+# 1 = handlers das rotas quentes como async def, direto no event loop (comparado pelo loadtest.py)
+ASYNC_HANDLERS = os.environ.get("ASYNC_HANDLERS", "0") == "1"
+# snapshot compartilhado entre workers (RAM em /dev/shm quando existir)
+SNAPSHOT_DIR = os.environ.get("SNAPSHOT_DIR") or ("/dev/shm" if os.path.isdir("/dev/shm") else "/tmp")
 TBL_REGEX = re.compile(
     r"^relatorio_positivador_(janeiro|fevereiro|mar[cç]o|abril|maio|junho|julho|agosto|setembro|outubro|novembro|dezembro)_2025$",
     re.IGNORECASE
@@ -73,8 +91,50 @@ class MetricasPayload(BaseModel):
     metas: MetasModel
     tabela: List[LinhaTabela]
     detalhes: List[LinhaDetalhe]  # NOVO
+    versao: str = ""              # "AAAA-MM:digest,..." — um digest por mês (tabelas do snapshot + filtro)
 
-app = FastAPI(title="Positivadores 2025 • Ativações, Captação e Receita")
+# NOVO: histórico de um cliente em todas as tabelas mensais
+class ClienteHistorico(BaseModel):
+    cliente: str
+    linhas: List[LinhaDetalhe]    # ordenadas por mês
+
+# NOVO: ranking / top-N por assessor
+class LinhaRanking(BaseModel):
+    posicao: int
+    assessor: str
+    total: float
+    meta: float                   # meta proporcional aos meses do período
+    atingimento: float            # total / meta (0 se meta <= 0)
+
+class RankingPayload(BaseModel):
+    metrica: str
+    periodo: str
+    meses: List[str]
+    ordem: str
+    por_meta: bool
+    itens: List[LinhaRanking]
+
+# NOVO: patch devolvido quando o cliente já tem uma versão (?versao=...)
+class MetricasPatch(BaseModel):
+    base: str                     # versão sobre a qual o patch se aplica
+    versao: str                   # versão resultante
+    series: Optional[List[str]]   # None quando nada mudou (versao == base)
+    meses: List[str]              # lista completa; meses ausentes foram removidos
+    meses_alterados: List[str]
+    ativacoes: Dict[str, Dict[str, int]]    # só os meses alterados
+    captacao: Dict[str, Dict[str, float]]
+    receita: Dict[str, Dict[str, float]]
+    metas: Optional[MetasModel]   # completas (dependem do total do ano); None quando nada mudou
+    tabela: List[LinhaTabela]     # só os meses alterados
+    detalhes: List[LinhaDetalhe]
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if THREADPOOL_SIZE > 0:
+        anyio.to_thread.current_default_thread_limiter().total_tokens = THREADPOOL_SIZE
+    yield
+
+app = FastAPI(title="Positivadores 2025 • Ativações, Captação e Receita", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -201,40 +261,52 @@ def consultar_detalhes(conn, schema: str, tabela: str,
         return cur.fetchall()
 
 def _seeded_rng(key: str) -> random.Random:
-    h = abs(hash(key)) & 0xFFFFFFFF
+    # crc32 e não hash(): hash() de str muda por processo, e as metas precisam bater entre workers
+    h = zlib.crc32(key.encode("utf-8")) & 0xFFFFFFFF
     return random.Random(h)
 
-def montar_payload(limit_tables: Optional[int] = None,
-                   assessores_filter: Optional[Set[str]] = None) -> MetricasPayload:
-    tabelas = listar_tabelas_positivador_2025(limit=limit_tables)
-
-    ativ_matrix = defaultdict(lambda: defaultdict(int))
-    capt_matrix = defaultdict(lambda: defaultdict(float))
-    rece_matrix = defaultdict(lambda: defaultdict(float))
-    linhas: List[LinhaTabela] = []
-    detalhes: List[LinhaDetalhe] = []
+# ---------- metas aleatórias (determinísticas) ----------
+def calcular_metas(assessores: List[str],
+                   ativacoes: Dict[str, Dict[str, int]],
+                   captacao: Dict[str, Dict[str, float]],
+                   receita: Dict[str, Dict[str, float]]) -> MetasModel:
+    metas_ativ: Dict[str, int] = {}
+    metas_capt: Dict[str, float] = {}
+    metas_rece: Dict[str, float] = {}
+    for a in assessores:
+        total_a = sum(ativacoes.get(a, {}).values())
+        total_c = sum(captacao.get(a, {}).values())
+        total_r = sum(receita.get(a, {}).values())
+        rng_a = _seeded_rng(a + "_ativ")
+        rng_c = _seeded_rng(a + "_capt")
+        rng_r = _seeded_rng(a + "_rece")
+        f_a = rng_a.uniform(0.80, 1.40)
+        f_c = rng_c.uniform(0.85, 1.35)
+        f_r = rng_r.uniform(0.90, 1.30)
+        metas_ativ[a] = max(1, int(round(total_a * f_a))) if total_a > 0 else rng_a.randint(2, 10)
+        mc = total_c * f_c if total_c > 0 else rng_c.uniform(30000, 300000)
+        mr = total_r * f_r if total_r > 0 else rng_r.uniform(20000, 200000)
+        metas_capt[a] = float(int(mc // 1000) * 1000)
+        metas_rece[a] = float(int(mr // 1000) * 1000)
+    return MetasModel(ativacoes=metas_ativ, captacao=metas_capt, receita=metas_rece)
 
+# -------- leitura do banco -> snapshot compartilhado ----------
+def construir_dataset() -> List[TabelaBruta]:
+    """Lê todas as tabelas do banco (agregados + detalhes já normalizados)."""
+    dataset: List[TabelaBruta] = []
+    tabelas = listar_tabelas_positivador_2025()
     with get_conn() as conn:
         for t in tabelas:
-            mes = mes_from_table(t)
-
             # descobre colunas (agregados)
             col_ativ = descobrir_coluna(conn, SCHEMA, t, COL_ATIV_CAND, "ativ")
             col_capt = descobrir_coluna(conn, SCHEMA, t, COL_CAPT_CAND, "capta")
             col_rece = descobrir_coluna(conn, SCHEMA, t, COL_RECE_CAND, "receit")
 
             # métricas agregadas por assessor (mantém gráficos/cards)
-            for assessor, ativ, capt, rece in consultar_metricas(conn, SCHEMA, t, col_ativ, col_capt, col_rece):
-                ass = str(assessor)
-                if assessores_filter and ass not in assessores_filter:
-                    continue
-                a = int(ativ or 0)
-                c = float(capt or 0.0)
-                r = float(rece or 0.0)
-                ativ_matrix[ass][mes] += a
-                capt_matrix[ass][mes] += c
-                rece_matrix[ass][mes] += r
-                linhas.append(LinhaTabela(assessor=ass, mes=mes, ativacoes=a, captacao=c, receita=r))
+            linhas = [
+                (str(assessor), int(ativ or 0), float(capt or 0.0), float(rece or 0.0))
+                for assessor, ativ, capt, rece in consultar_metricas(conn, SCHEMA, t, col_ativ, col_capt, col_rece)
+            ]
 
             # ----------- DETALHES (linha a linha) -----------
             col_assessor = "assessor"
@@ -248,111 +320,362 @@ def montar_payload(limit_tables: Optional[int] = None,
                 col_ativ, col_evad,
                 col_net, col_rece, col_capt
             )
+            detalhes = [
+                (str(r[0]) if r[0] is not None else "",
+                 str(r[1]) if r[1] is not None else "",
+                 _as_sim_nao(r[2]) == "Sim", _as_sim_nao(r[3]) == "Sim",
+                 _as_float(r[4]), _as_float(r[5]), _as_float(r[6]))
+                for r in raw_rows
+            ]
+            dataset.append(TabelaBruta(t, mes_from_table(t), linhas, detalhes))
+    return dataset
+
+SNAPSHOT = SnapshotCompartilhado(os.path.join(SNAPSHOT_DIR, "positivador_2025.snap"),
+                                 construir_dataset, CACHE_TTL_S)
+
+def tabelas_por_mes(snap, limit: Optional[int] = None) -> List[Tuple[str, List[int]]]:
+    """Agrupa as tabelas do snapshot (índices) pelo mês (AAAA-MM), em ordem cronológica."""
+    grupos: Dict[str, List[int]] = defaultdict(list)
+    tabelas = snap.tabelas[:limit] if limit else snap.tabelas
+    for ti, t in enumerate(tabelas):
+        grupos[t["mes"]].append(ti)
+    return sorted(grupos.items())
+
+def coletar_mes(snap, mes: str, tabelas: List[int],
+                assessores_filter: Optional[Set[str]] = None) -> Tuple[List[dict], List[dict]]:
+    """Linhas do mês como dicts com os campos de LinhaTabela / LinhaDetalhe.
+
+    Dicts (e não modelos) para o stream serializar direto com json.dumps;
+    o payload completo os valida ao montar MetricasPayload.
+    """
+    linhas: List[dict] = []
+    detalhes: List[dict] = []
+    mes_nome = MESES_LABEL.get(mes, mes)
+    for ti in tabelas:
+        for ass, ativ, capt, rece in snap.linhas(ti):
+            if assessores_filter and ass not in assessores_filter:
+                continue
+            linhas.append({"assessor": ass, "mes": mes, "ativacoes": ativ, "captacao": capt, "receita": rece})
+
+        for ass, cliente, ativou, evadiu, net, receita, capt in snap.detalhes(ti):
+            if assessores_filter and ass not in assessores_filter:
+                continue
+            detalhes.append({
+                "assessor": ass,
+                "cliente": cliente,
+                "ativou_em_m": "Sim" if ativou else "Não",
+                "evadiu_em_m": "Sim" if evadiu else "Não",
+                "net_em_m": net,
+                "receita_no_mes": receita,
+                "captacao_liquida_em_m": capt,
+                "mes": mes,
+                "mes_nome": mes_nome,
+            })
+    return linhas, detalhes
+
+class _Acumulador:
+    """Matrizes assessor x mês acumuladas mês a mês (payload completo e streaming)."""
+    def __init__(self):
+        self.ativ = defaultdict(lambda: defaultdict(int))
+        self.capt = defaultdict(lambda: defaultdict(float))
+        self.rece = defaultdict(lambda: defaultdict(float))
+
+    def somar(self, linhas: List[dict]):
+        for l in linhas:
+            self.ativ[l["assessor"]][l["mes"]] += l["ativacoes"]
+            self.capt[l["assessor"]][l["mes"]] += l["captacao"]
+            self.rece[l["assessor"]][l["mes"]] += l["receita"]
+
+    def meses(self) -> List[str]:
+        return sorted(
+            {m for a in self.ativ for m in self.ativ[a].keys()} |
+            {m for a in self.capt for m in self.capt[a].keys()} |
+            {m for a in self.rece for m in self.rece[a].keys()}
+        )
+
+    def assessores(self) -> List[str]:
+        return sorted(set(list(self.ativ.keys()) + list(self.capt.keys()) + list(self.rece.keys())))
+
+    def matrizes(self):
+        meses, assessores = self.meses(), self.assessores()
+        ativacoes = {a: {m: int(self.ativ[a].get(m, 0)) for m in meses} for a in assessores}
+        captacao  = {a: {m: float(self.capt[a].get(m, 0.0)) for m in meses} for a in assessores}
+        receita   = {a: {m: float(self.rece[a].get(m, 0.0)) for m in meses} for a in assessores}
+        return meses, assessores, ativacoes, captacao, receita
 
-            for r in raw_rows:
-                ass = str(r[0]) if r[0] is not None else ""
-                if assessores_filter and ass not in assessores_filter:
-                    continue
-                cliente = str(r[1]) if r[1] is not None else ""
-                ativou  = _as_sim_nao(r[2])
-                evadiu  = _as_sim_nao(r[3])
-                net     = _as_float(r[4])
-                receita = _as_float(r[5])
-                capt    = _as_float(r[6])
-                detalhes.append(
-                    LinhaDetalhe(
-                        assessor=ass,
-                        cliente=cliente,
-                        ativou_em_m=ativou,
-                        evadiu_em_m=evadiu,
-                        net_em_m=net,
-                        receita_no_mes=receita,
-                        captacao_liquida_em_m=capt,
-                        mes=mes,
-                        mes_nome=MESES_LABEL.get(mes, mes)
-                    )
-                )
-
-    meses_presentes = sorted(
-        {m for a in ativ_matrix for m in ativ_matrix[a].keys()} |
-        {m for a in capt_matrix for m in capt_matrix[a].keys()} |
-        {m for a in rece_matrix for m in rece_matrix[a].keys()}
-    )
-    assessores = sorted(set(list(ativ_matrix.keys()) + list(capt_matrix.keys()) + list(rece_matrix.keys())))
+def montar_payload(limit_tables: Optional[int] = None,
+                   assessores_filter: Optional[Set[str]] = None) -> MetricasPayload:
+    snap = SNAPSHOT.atual()
 
-    ativacoes = {a: {m: int(ativ_matrix[a].get(m, 0)) for m in meses_presentes} for a in assessores}
-    captacao  = {a: {m: float(capt_matrix[a].get(m, 0.0)) for m in meses_presentes} for a in assessores}
-    receita   = {a: {m: float(rece_matrix[a].get(m, 0.0)) for m in meses_presentes} for a in assessores}
+    acc = _Acumulador()
+    linhas: List[dict] = []
+    detalhes: List[dict] = []
 
-    # ---------- metas aleatórias (determinísticas) ----------
-    metas_ativ: Dict[str, int] = {}
-    metas_capt: Dict[str, float] = {}
-    metas_rece: Dict[str, float] = {}
-    for a in assessores:
-        total_a = sum(ativacoes[a].values())
-        total_c = sum(captacao[a].values())
-        total_r = sum(receita[a].values())
-        rng_a = _seeded_rng(a + "_ativ")
-        rng_c = _seeded_rng(a + "_capt")
-        rng_r = _seeded_rng(a + "_rece")
-        f_a = rng_a.uniform(0.80, 1.40)
-        f_c = rng_c.uniform(0.85, 1.35)
-        f_r = rng_r.uniform(0.90, 1.30)
-        metas_ativ[a] = max(1, int(round(total_a * f_a))) if total_a > 0 else rng_a.randint(2, 10)
-        mc = total_c * f_c if total_c > 0 else rng_c.uniform(30000, 300000)
-        mr = total_r * f_r if total_r > 0 else rng_r.uniform(20000, 200000)
-        metas_capt[a] = float(int(mc // 1000) * 1000)
-        metas_rece[a] = float(int(mr // 1000) * 1000)
-    metas = MetasModel(ativacoes=metas_ativ, captacao=metas_capt, receita=metas_rece)
+    for mes, ts in tabelas_por_mes(snap, limit_tables):
+        l, d = coletar_mes(snap, mes, ts, assessores_filter)
+        acc.somar(l)
+        linhas.extend(l)
+        detalhes.extend(d)
+
+    meses_presentes, assessores, ativacoes, captacao, receita = acc.matrizes()
+    metas = calcular_metas(assessores, ativacoes, captacao, receita)
 
     return MetricasPayload(
         series=assessores, meses=meses_presentes,
         ativacoes=ativacoes, captacao=captacao, receita=receita,
-        metas=metas, tabela=linhas, detalhes=detalhes
+        metas=metas, tabela=linhas, detalhes=detalhes,
+        versao=versao_snapshot(snap, limit_tables, assessores_filter)
+    )
+
+# -------- NOVO: streaming NDJSON (um registro por mês + registro final) ----------
+def stream_payload(snap, limit_tables: Optional[int] = None,
+                   assessores_filter: Optional[Set[str]] = None):
+    """Gera linhas NDJSON: {"tipo":"mes",...} por mês e {"tipo":"fim",...} no final.
+
+    Recebe o snapshot já resolvido: falhas ao obtê-lo precisam acontecer antes
+    do status 200 ir para o cliente. Só as matrizes agregadas ficam em
+    memória; as linhas de cada mês são descartadas depois de enviadas.
+    """
+    acc = _Acumulador()
+
+    for mes, ts in tabelas_por_mes(snap, limit_tables):
+        linhas, detalhes = coletar_mes(snap, mes, ts, assessores_filter)
+        acc.somar(linhas)
+        doms = sorted({l["assessor"] for l in linhas})
+        rec = {
+            "tipo": "mes", "mes": mes,
+            "ativacoes": {a: acc.ativ[a][mes] for a in doms},
+            "captacao": {a: acc.capt[a][mes] for a in doms},
+            "receita": {a: acc.rece[a][mes] for a in doms},
+            "tabela": linhas, "detalhes": detalhes,
+        }
+        yield json.dumps(rec, ensure_ascii=False) + "\n"
+
+    meses_presentes, assessores, ativacoes, captacao, receita = acc.matrizes()
+    fim = {
+        "tipo": "fim", "series": assessores, "meses": meses_presentes,
+        "metas": calcular_metas(assessores, ativacoes, captacao, receita),
+        "versao": versao_snapshot(snap, limit_tables, assessores_filter),
+    }
+    yield json.dumps(jsonable_encoder(fim), ensure_ascii=False) + "\n"
+
+# -------- NOVO: versão por mês + patch (delta sync) ----------
+def versao_snapshot(snap, limit_tables: Optional[int] = None,
+                    assessores_filter: Optional[Set[str]] = None) -> str:
+    """Versão "AAAA-MM:digest,..." sem montar o payload.
+
+    Cada digest combina os digests das tabelas do mês (gravados no header do
+    snapshot) com o filtro; só entram os meses em que o filtro tem linhas,
+    como em MetricasPayload.meses.
+    """
+    ids = None
+    if assessores_filter:
+        ids = {i for i in map(snap.id_texto, assessores_filter) if i is not None}
+    chave = ",".join(sorted(assessores_filter)) if assessores_filter else ""
+    partes = []
+    for mes, ts in tabelas_por_mes(snap, limit_tables):
+        faixas = [range(*snap.tabelas[ti]["linhas"]) for ti in ts]
+        if not any(ids is None or snap.l_ass[r] in ids for f in faixas for r in f):
+            continue
+        h = hashlib.blake2b(chave.encode("utf-8"), digest_size=8)
+        for ti in ts:
+            h.update(snap.tabelas[ti]["digest"].encode("ascii"))
+        partes.append(f"{mes}:{h.hexdigest()}")
+    return ",".join(partes)
+
+def parse_versao(versao: str) -> Dict[str, str]:
+    out: Dict[str, str] = {}
+    for parte in (versao or "").split(","):
+        mes, sep, dig = parte.strip().partition(":")
+        if sep and mes and dig:
+            out[mes] = dig
+    return out
+
+def patch_vazio(versao: str) -> MetricasPatch:
+    """Patch sem alterações: o cliente já tem a versão atual e mantém o que tem."""
+    return MetricasPatch(base=versao, versao=versao, series=None, meses=list(parse_versao(versao)),
+                         meses_alterados=[], ativacoes={}, captacao={}, receita={},
+                         metas=None, tabela=[], detalhes=[])
+
+def montar_patch(payload: MetricasPayload, versao_cliente: str) -> MetricasPatch:
+    cliente = parse_versao(versao_cliente)
+    atual = parse_versao(payload.versao)
+    alterados = [m for m in payload.meses if cliente.get(m) != atual.get(m)]
+    alt = set(alterados)
+    return MetricasPatch(
+        base=versao_cliente, versao=payload.versao,
+        series=payload.series, meses=payload.meses, meses_alterados=alterados,
+        ativacoes={a: {m: v for m, v in d.items() if m in alt} for a, d in payload.ativacoes.items()} if alt else {},
+        captacao={a: {m: v for m, v in d.items() if m in alt} for a, d in payload.captacao.items()} if alt else {},
+        receita={a: {m: v for m, v in d.items() if m in alt} for a, d in payload.receita.items()} if alt else {},
+        metas=payload.metas,
+        tabela=[l for l in payload.tabela if l.mes in alt],
+        detalhes=[d for d in payload.detalhes if d.mes in alt]
     )
 
+# -------- NOVO: drill-down por cliente (índice cliente -> linhas no snapshot) ----------
+def historico_cliente(cliente: str) -> ClienteHistorico:
+    linhas = [
+        LinhaDetalhe(
+            assessor=ass, cliente=cliente,
+            ativou_em_m="Sim" if ativou else "Não", evadiu_em_m="Sim" if evadiu else "Não",
+            net_em_m=net, receita_no_mes=receita, captacao_liquida_em_m=capt,
+            mes=mes, mes_nome=MESES_LABEL.get(mes, mes)
+        )
+        for mes, (ass, _, ativou, evadiu, net, receita, capt) in SNAPSHOT.atual().detalhes_cliente(cliente)
+    ]
+    return ClienteHistorico(cliente=cliente, linhas=linhas)
+
+# -------- NOVO: agregados por assessor/mês (ranking) ----------
+def agregados() -> Dict[str, Dict[str, Dict[str, float]]]:
+    snap = SNAPSHOT.atual()
+    acc = _Acumulador()
+    for ti, t in enumerate(snap.tabelas):
+        acc.somar([{"assessor": ass, "mes": t["mes"], "ativacoes": ativ, "captacao": capt, "receita": rece}
+                   for ass, ativ, capt, rece in snap.linhas(ti)])
+    return {"ativacoes": acc.ativ, "captacao": acc.capt, "receita": acc.rece}
+
+METRICAS = ("ativacoes", "captacao", "receita")
+PERIODO_REGEX = re.compile(r"^(\d{4})(?:-(0[1-9]|1[0-2])|-Q([1-4]))?$", re.IGNORECASE)
+ANOS_DADOS = {m[:4] for m in MESES_LABEL}  # anos cobertos pelas tabelas (hoje só 2025)
+
+def meses_do_periodo(periodo: str) -> List[str]:
+    """'2025' (ano), '2025-Q3' (trimestre) ou '2025-07' (mês)."""
+    m = PERIODO_REGEX.match(periodo.strip())
+    if not m or m.group(1) not in ANOS_DADOS:
+        raise HTTPException(status_code=422, detail=f"Período inválido: {periodo} (use AAAA, AAAA-Qn ou AAAA-MM)")
+    ano, mes, tri = m.groups()
+    if mes:
+        return [f"{ano}-{mes}"]
+    if tri:
+        q = int(tri)
+        return [f"{ano}-{i:02d}" for i in range(3 * q - 2, 3 * q + 1)]
+    return [f"{ano}-{i:02d}" for i in range(1, 13)]
+
+def montar_ranking(metrica: str, periodo: str, ordem: str, n: int, por_meta: bool) -> RankingPayload:
+    agg = agregados()
+    meses = meses_do_periodo(periodo)
+    assessores = sorted(set().union(*(agg[k].keys() for k in METRICAS)))
+    dados = agg[metrica]
+    totais = {a: float(sum(dados.get(a, {}).get(m, 0) for m in meses)) for a in assessores}
+    metas_ano = getattr(calcular_metas(assessores, agg["ativacoes"], agg["captacao"], agg["receita"]), metrica)
+    # metas saem do total de todos os meses com dados: proporcionais à fração desses meses no período
+    presentes = {m for k in METRICAS for ms in agg[k].values() for m in ms}
+    if not presentes.intersection(meses):
+        # período sem nenhuma tabela carregada: nada a ranquear
+        return RankingPayload(metrica=metrica, periodo=periodo, meses=meses,
+                              ordem=ordem, por_meta=por_meta, itens=[])
+    fator = len(presentes.intersection(meses)) / len(presentes)
+    metas = {a: float(v) * fator for a, v in metas_ano.items()}
+
+    def ating(a: str) -> float:
+        meta = metas.get(a, 0.0)
+        return totais[a] / meta if meta > 0 else 0.0
+
+    chave = ating if por_meta else totais.__getitem__
+    escolher = heapq.nsmallest if ordem == "asc" else heapq.nlargest
+    top = escolher(n, assessores, key=lambda a: (chave(a), a))
+    itens = [
+        LinhaRanking(posicao=i, assessor=a, total=totais[a],
+                     meta=metas.get(a, 0.0), atingimento=ating(a))
+        for i, a in enumerate(top, start=1)
+    ]
+    return RankingPayload(metrica=metrica, periodo=periodo, meses=meses,
+                          ordem=ordem, por_meta=por_meta, itens=itens)
+
+def filtro_assessores(assessores: Optional[str]) -> Optional[Set[str]]:
+    """CSV de assessores -> conjunto; vazio (ou só vírgulas) significa sem filtro."""
+    if not assessores:
+        return None
+    return {s.strip() for s in assessores.split(",") if s.strip()} or None
+
 def listar_assessores() -> List[str]:
-    asses: Set[str] = set()
-    tabelas = listar_tabelas_positivador_2025()
-    with get_conn() as conn, conn.cursor() as cur:
-        for t in tabelas:
-            cur.execute(sql.SQL("""SELECT DISTINCT assessor FROM {sch}.{tb}""")
-                       .format(sch=sql.Identifier(SCHEMA), tb=sql.Identifier(t)))
-            for (a,) in cur.fetchall():
-                asses.add(str(a))
-    return sorted(asses, key=lambda x: (len(x), x))
+    return sorted(SNAPSHOT.atual().assessores, key=lambda x: (len(x), x))
 
 # ====== Endpoints ======
+def rota_quente(caminho: str, **kwargs):
+    """app.get que, com ASYNC_HANDLERS=1, registra o handler como async def.
+
+    Os handlers só leem o snapshot em mmap, então podem rodar no event loop sem
+    passar pelo threadpool; a reconstrução do snapshot (consulta ao banco) roda
+    numa thread à parte. A exceção é a primeira construção, quando ainda não
+    existe snapshot: ela bloqueia o loop do worker enquanto dura.
+    """
+    def decorador(f):
+        if not ASYNC_HANDLERS:
+            return app.get(caminho, **kwargs)(f)
+
+        @functools.wraps(f)
+        async def handler(*args, **kw):
+            return f(*args, **kw)
+        app.get(caminho, **kwargs)(handler)
+        return f
+    return decorador
+
 @app.get("/health")
 def health():
     return {"ok": True}
 
 @app.get("/api/tabelas", response_model=List[str])
 def api_tabelas():
-    return listar_tabelas_positivador_2025()
+    return [t["nome"] for t in SNAPSHOT.atual().tabelas]
 
-@app.get("/api/assessores", response_model=List[str])
+@rota_quente("/api/assessores", response_model=List[str])
 def api_assessores():
     return listar_assessores()
 
-@app.get("/api/metricas", response_model=MetricasPayload)
+@rota_quente("/api/metricas", response_model=Union[MetricasPatch, MetricasPayload])
 def api_metricas(
     limit_tables: Optional[int] = Query(default=None, ge=1),
-    assessores: Optional[str] = Query(default=None, description="CSV de IDs de assessor")
+    assessores: Optional[str] = Query(default=None, description="CSV de IDs de assessor"),
+    versao: Optional[str] = Query(default=None, description="Versão que o cliente já tem; devolve só o patch")
 ):
-    filtro = None
-    if assessores:
-        filtro = {s.strip() for s in assessores.split(",") if s.strip()}
+    filtro = filtro_assessores(assessores)
+    if versao and parse_versao(versao):
+        # polling sem mudança: responde só com a versão, sem montar o payload
+        if versao == versao_snapshot(SNAPSHOT.atual(), limit_tables, filtro):
+            return patch_vazio(versao)
+        return montar_patch(montar_payload(limit_tables=limit_tables, assessores_filter=filtro), versao)
     return montar_payload(limit_tables=limit_tables, assessores_filter=filtro)
 
-@app.get("/api/metricas_csv")
+@app.get("/api/clientes/{cliente_id}", response_model=ClienteHistorico)
+def api_cliente(cliente_id: str):
+    hist = historico_cliente(cliente_id)
+    if not hist.linhas:
+        raise HTTPException(status_code=404, detail=f"Cliente não encontrado: {cliente_id}")
+    return hist
+
+@app.get("/api/clientes", response_model=List[ClienteHistorico])
+def api_clientes(ids: str = Query(..., description="CSV de IDs de cliente")):
+    lista = [s.strip() for s in ids.split(",") if s.strip()]
+    return [historico_cliente(c) for c in dict.fromkeys(lista)]
+
+@app.get("/api/ranking", response_model=RankingPayload)
+def api_ranking(
+    metrica: str = Query(default="captacao", pattern="^(ativacoes|captacao|receita)$"),
+    periodo: str = Query(default="2025", description="AAAA, AAAA-Qn ou AAAA-MM"),
+    ordem: str = Query(default="desc", pattern="^(asc|desc)$"),
+    n: int = Query(default=20, ge=1, le=500),
+    por_meta: bool = Query(default=False, description="Ordena por atingimento da meta (total/meta)")
+):
+    return montar_ranking(metrica, periodo, ordem, n, por_meta)
+
+@app.get("/api/metricas_stream")
+def api_metricas_stream(
+    limit_tables: Optional[int] = Query(default=None, ge=1),
+    assessores: Optional[str] = Query(default=None, description="CSV de IDs de assessor")
+):
+    filtro = filtro_assessores(assessores)
+    snap = SNAPSHOT.atual()  # antes do StreamingResponse: erro vira 5xx, não 200 vazio
+    return StreamingResponse(stream_payload(snap, limit_tables=limit_tables, assessores_filter=filtro),
+                             media_type="application/x-ndjson")
+
+@rota_quente("/api/metricas_csv")
 def api_metricas_csv(
     limit_tables: Optional[int] = Query(default=None, ge=1),
     assessores: Optional[str] = Query(default=None)
 ):
-    filtro = None
-    if assessores:
-        filtro = {s.strip() for s in assessores.split(",") if s.strip()}
+    filtro = filtro_assessores(assessores)
     payload = montar_payload(limit_tables=limit_tables, assessores_filter=filtro)
 
     buf = io.StringIO()
@@ -366,437 +689,60 @@ def api_metricas_csv(
                     headers={"Content-Disposition": "attachment; filename=detalhes_filtrado.csv"})
 
 # ====== Frontend ======
-@app.get("/", response_class=HTMLResponse)
-def index():
-    return """
-<!DOCTYPE html>
-<html lang="pt-br"><head>
-<meta charset="utf-8"/><meta name="viewport" content="width=device-width,initial-scale=1"/>
-<title>Positivadores 2025 • Ativações / Captação / Receita</title>
-<script src="https://cdn.plot.ly/plotly-2.35.2.min.js"></script>
-<style>
-  :root{
-    --bg:#0b0c12; --card:#121424; --card2:#0e1020; --stroke:#23283b;
-    --text:#e8ebff; --muted:#9fb0d9;
-    --green:#4caf50; --green-800:#2e7d32;
-    --amber:#ffb300; --amber-900:#996f00;
-    --blue:#82aaff; --accent2:#5ad6b0;
-  }
-  *{box-sizing:border-box}
-  body{margin:0;background:linear-gradient(180deg,#090a12 0%,#0b0c12 60%,#0b0c12 100%);color:var(--text);font-family:Inter,system-ui,Segoe UI,Roboto,Arial,sans-serif}
-  header{position:sticky;top:0;z-index:5;background:rgba(9,10,18,.7);backdrop-filter:blur(10px);border-bottom:1px solid #1a1f33}
-  header .bar{max-width:1400px;margin:0 auto;display:flex;align-items:center;gap:16px;padding:12px 20px}
-  .brand{font-weight:700;letter-spacing:.2px}
-  .wrap{max-width:1400px;margin:0 auto;padding:22px}
-
-  .cards{display:grid;grid-template-columns:repeat(12,1fr);gap:16px}
-  .card{background:var(--card);border:1px solid var(--stroke);border-radius:18px;padding:16px;box-shadow:0 10px 30px rgba(0,0,0,.35)}
-  .col-4{grid-column:span 4} .col-12{grid-column:span 12}
-  @media (max-width:1100px){ .col-4{grid-column:span 12} }
-
-  .kpicard h3{margin:0 0 2px 0;font-size:18px}
-  .kpicard .meta{color:var(--muted);font-size:12px;margin-bottom:8px}
-  .kpicard .valor{font-size:26px;font-weight:800;margin-bottom:6px}
-  .kpicard .pct{font-weight:800;border-radius:12px;padding:2px 8px;display:inline-block}
-  .pct.green{background:#16351a;color:#9ef8a1;border:1px solid #235a2a}
-  .pct.amber{background:#3a2d00;color:#ffec99;border:1px solid #6b5200}
-  .barwrap{height:10px;background:#1b2033;border:1px solid #2b3353;border-radius:999px;overflow:hidden;margin-top:10px}
-  .bar{height:100%}
-  .bar.green{background:linear-gradient(90deg,#2e7d32,#4caf50)}
-  .bar.amber{background:linear-gradient(90deg,#996f00,#ffb300)}
-
-  .toolbar{display:flex;gap:12px;flex-wrap:wrap;align-items:center;margin:16px 0 12px}
-  .select{min-width:360px;position:relative}
-  .select input{width:100%;padding:11px 12px;border:1px solid var(--stroke);background:var(--card2);color:var(--text);border-radius:12px;outline:none}
-  .dropdown{position:absolute;top:48px;left:0;right:0;max-height:300px;overflow:auto;background:var(--card2);border:1px solid var(--stroke);border-radius:12px;display:none;z-index:10}
-  .opt{padding:9px 10px;border-bottom:1px solid #1c2140;cursor:pointer;display:flex;gap:8px;align-items:center}
-  .opt:hover{background:#171b33}
-  .chips{display:flex;flex-wrap:wrap;gap:6px;margin-top:8px;max-height:64px;overflow:auto}
-  .chip{background:var(--card2);border:1px solid var(--stroke);border-radius:999px;padding:4px 10px;font-size:12px}
-  .btn{padding:10px 12px;border:1px solid var(--stroke);background:var(--card2);color:var(--text);border-radius:12px;cursor:pointer}
-  .btn:hover{filter:brightness(1.08)}
-
-  .chart{
-    height:260px;
-    border-radius:14px;
-    overflow:hidden;
-    box-shadow:0 12px 30px rgba(0,0,0,.35), inset 0 0 0 1px rgba(255,255,255,.03);
-  }
-  .card h3{font-size:16px;font-weight:700;letter-spacing:.2px;margin:0 0 6px;color:#dfe6ff}
-
-  #chart{display:none}
-
-  /* ======= NOVO CSS DA TABELA (preenche container + sticky header + primeira coluna fixa) ======= */
-  .tablewrap{
-    max-height:58vh;
-    overflow:auto;
-    border:1px solid var(--stroke);
-    border-radius:12px;
-    margin-top:8px;
-  }
-  table{
-    width:100%;
-    table-layout:fixed;
-    border-collapse:separate;
-    border-spacing:0;
-    margin:0;
-  }
-  thead th{
-    position:sticky;
-    top:0;
-    background:#12152a;
-    border-bottom:1px solid var(--stroke);
-    z-index:3;
-  }
-  th,td{
-    padding:10px;
-    border-bottom:1px solid #20243a;
-    overflow:hidden;
-    text-overflow:ellipsis;
-    white-space:nowrap;
-  }
-  th:first-child, td:first-child{
-    position:sticky;
-    left:0;
-    background:#0f1220;
-    border-right:1px solid #1e2136;
-    z-index:2;
-  }
-  thead th:first-child{
-    z-index:4;
-  }
-  /* ========================================================= */
-
-  .muted{color:var(--muted);font-size:12px} .right{margin-left:auto} .small{font-size:12px}
-  .loading{opacity:.5;pointer-events:none}
-</style></head>
-<body>
-<header>
-  <div class="bar">
-    <div class="brand">Positivadores 2025 • Ativações / Captação / Receita</div>
-    <div class="muted small">Dados do PostgreSQL (AWS) + Metas simuladas</div>
-    <div class="right"></div>
-    <a class="btn" id="btnCSV" href="#" download>Baixar CSV</a>
-  </div>
-</header>
-
-<div class="wrap">
-  <div class="cards">
-    <div class="card kpicard col-4" id="cardAtiv">
-      <h3>Ativação</h3>
-      <div class="meta">Meta <b id="metaAtiv">—</b></div>
-      <div class="valor" id="valAtiv">—</div>
-      <span class="pct green" id="pctAtiv">—</span>
-      <div class="barwrap"><div class="bar green" id="barAtiv" style="width:0%"></div></div>
-    </div>
-    <div class="card kpicard col-4" id="cardCapt">
-      <h3>Captação</h3>
-      <div class="meta">Meta <b id="metaCapt">—</b></div>
-      <div class="valor" id="valCapt">—</div>
-      <span class="pct amber" id="pctCapt">—</span>
-      <div class="barwrap"><div class="bar amber" id="barCapt" style="width:0%"></div></div>
-    </div>
-    <div class="card kpicard col-4" id="cardRece">
-      <h3>Receita</h3>
-      <div class="meta">Meta <b id="metaRece">—</b></div>
-      <div class="valor" id="valRece">—</div>
-      <span class="pct green" id="pctRece">—</span>
-      <div class="barwrap"><div class="bar green" id="barRece" style="width:0%"></div></div>
-    </div>
-  </div>
-
-  <div class="card col-12" style="margin-top:16px">
-    <div class="toolbar">
-      <div class="select" id="assSel">
-        <input id="assSearch" placeholder="Filtrar assessor... (digite para buscar, clique para abrir)" autocomplete="off"/>
-        <div class="dropdown" id="assDrop"></div>
-        <div class="chips" id="chips"></div>
-      </div>
-      <button class="btn" id="btnAll">Selecionar todos</button>
-      <button class="btn" id="btnClear">Limpar</button>
-
-      <div class="right"></div>
-      <div class="toolbar" style="gap:8px;margin:0">
-        <button class="btn" id="segLine" title="Linhas">Linhas</button>
-        <button class="btn" id="segBar"  title="Barras empilhadas">Barras</button>
-      </div>
-    </div>
-
-    <div class="cards">
-      <div class="card col-4">
-        <h3 style="margin:0 0 6px">Ativação</h3>
-        <div id="chartAtiv" class="chart"></div>
-      </div>
-      <div class="card col-4">
-        <h3 style="margin:0 0 6px">Captação</h3>
-        <div id="chartCapt" class="chart"></div>
-      </div>
-      <div class="card col-4">
-        <h3 style="margin:0 0 6px">Receita</h3>
-        <div id="chartRece" class="chart"></div>
-      </div>
-    </div>
-  </div>
-
-  <!-- Tabela de Detalhamento (sem coluna AAAA-MM na UI) -->
-  <div class="card col-12">
-    <h3 style="margin:0 0 8px">Detalhamento (linhas da AWS)</h3>
-    <div class="muted small">Colunas: Assessor, Cliente, Ativou em M?, Evadiu em M?, Net em M, Receita no Mês, Captação Líquida em M, Mês (nome)</div>
-    <div id="tbl" class="tablewrap"></div>
-  </div>
-</div>
-
-<script>
-let ALL_ASSESSORES = [];
-let SELECTED = new Set();
-let CHART_MODE = 'line';
-let DATA = null;
-
-const COLORWAY = [
-  '#82aaff','#5ad6b0','#ffd166','#ef476f','#06d6a0',
-  '#f78c6b','#c792ea','#29b6f6','#ff9f1c','#8bd450',
-  '#64b5f6','#9ccc65','#ffb74d','#ba68c8'
-];
-
-const BASE_LAYOUT = {
-  paper_bgcolor:'#121424',
-  plot_bgcolor:'#121424',
-  font:{color:'#e6e9ff', family:'Inter, system-ui, Segoe UI, Roboto, Arial, sans-serif', size:12},
-  margin:{l:56,r:14,t:6,b:40},
-  hovermode:'x unified',
-  hoverlabel:{bgcolor:'#0e1020', bordercolor:'#2b3353', font:{size:12}},
-  legend:{orientation:'h', y:1.08, x:0, xanchor:'left', bgcolor:'rgba(14,16,32,.6)', bordercolor:'#2b3353', borderwidth:1, font:{size:11}},
-  xaxis:{title:'Mês', tickangle:0, gridcolor:'#26304b', zerolinecolor:'#2c3656', linecolor:'#2b3353', tickfont:{size:11}},
-  yaxis:{gridcolor:'#26304b', zerolinecolor:'#2c3656', linecolor:'#2b3353', tickfont:{size:11}},
-  colorway: COLORWAY
-};
-
-function el(id){ return document.getElementById(id); }
-function show(e,b){ e.style.display = b ? 'block':'none'; }
-
-async function fetchAssessores(){ const r = await fetch('/api/assessores'); return await r.json(); }
-async function fetchPayload(){
-  const list = [...SELECTED];
-  const query = list.length ? '?assessores='+encodeURIComponent(list.join(',')) : '';
-  const r = await fetch('/api/metricas'+query);
-  return await r.json();
-}
+# Assets em static/: lidos e comprimidos (gzip) uma vez na subida. CSS/JS são servidos
+# em /assets/<hash>/<nome> com cache imutável; o index.html revalida via ETag.
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+ASSET_TIPOS = {".html": "text/html; charset=utf-8", ".css": "text/css; charset=utf-8",
+               ".js": "application/javascript; charset=utf-8"}
+CACHE_IMUTAVEL = "public, max-age=31536000, immutable"
+
+class Asset(NamedTuple):
+    corpo: bytes
+    gz: bytes
+    etag: str
+    tipo: str
+
+def _asset(corpo: bytes, nome: str) -> Asset:
+    etag = '"' + hashlib.blake2b(corpo, digest_size=8).hexdigest() + '"'
+    return Asset(corpo, gzip.compress(corpo, 9), etag, ASSET_TIPOS[os.path.splitext(nome)[1]])
+
+def carregar_assets() -> Tuple[Asset, Dict[str, Asset]]:
+    """Lê static/, comprime e troca {{nome}} no index.html pela URL versionada."""
+    assets: Dict[str, Asset] = {}
+    for raiz, _, arquivos in os.walk(STATIC_DIR):
+        for arq in arquivos:
+            caminho = os.path.join(raiz, arq)
+            nome = os.path.relpath(caminho, STATIC_DIR).replace(os.sep, "/")
+            if nome == "index.html" or os.path.splitext(nome)[1] not in ASSET_TIPOS:
+                continue
+            with open(caminho, "rb") as f:
+                assets[nome] = _asset(f.read(), nome)
+    with open(os.path.join(STATIC_DIR, "index.html"), encoding="utf-8") as f:
+        html = f.read()
+    for nome, a in assets.items():
+        html = html.replace("{{" + nome + "}}", f"/assets/{a.etag.strip(chr(34))}/{nome}")
+    return _asset(html.encode("utf-8"), "index.html"), assets
+
+INDEX_ASSET, ASSETS = carregar_assets()
+
+def servir_asset(request: Request, a: Asset, cache_control: str) -> Response:
+    headers = {"ETag": a.etag, "Cache-Control": cache_control, "Vary": "Accept-Encoding"}
+    if a.etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    if "gzip" in request.headers.get("accept-encoding", ""):
+        headers["Content-Encoding"] = "gzip"
+        return Response(content=a.gz, media_type=a.tipo, headers=headers)
+    return Response(content=a.corpo, media_type=a.tipo, headers=headers)
+
+@app.get("/assets/{versao}/{nome:path}")
+def asset(versao: str, nome: str, request: Request):
+    a = ASSETS.get(nome)
+    if a is None:
+        raise HTTPException(status_code=404, detail=f"Asset não encontrado: {nome}")
+    # versão antiga (HTML em cache de um deploy anterior): serve o atual sem cache longo
+    cache = CACHE_IMUTAVEL if a.etag.strip('"') == versao else "no-cache"
+    return servir_asset(request, a, cache)
 
-function renderDropdown(filter=''){
-  const box = el('assDrop');
-  const f = filter.trim().toLowerCase();
-  const arr = f ? ALL_ASSESSORES.filter(a => a.toLowerCase().includes(f)) : ALL_ASSESSORES.slice(0,600);
-  box.innerHTML = arr.map(a => {
-    const checked = SELECTED.has(a) ? '✓' : '';
-    return `<div class="opt" data-value="${a}">
-              <div style="width:18px;text-align:center">${checked}</div>
-              <div>${a}</div>
-            </div>`;
-  }).join('') || `<div class="opt muted">Nenhum encontrado</div>`;
-  show(box, true);
-}
-function renderChips(){
-  const chips = el('chips'); const list = [...SELECTED].sort();
-  chips.innerHTML = list.slice(0,30).map(a => `<span class="chip">${a}</span>`).join('') +
-                    (list.length>30 ? `<span class="chip">+${list.length-30}</span>`:'');
-}
-
-function fmtRS(v){ return v.toLocaleString('pt-BR',{style:'currency',currency:'BRL'}); }
-function fmtNum(v){ return v.toLocaleString('pt-BR',{minimumFractionDigits:2, maximumFractionDigits:2}); }
-
-function sumSelected(metricDict){
-  const series = DATA.series.filter(a => SELECTED.size ? SELECTED.has(a) : true);
-  const meses = DATA.meses;
-  let tot = 0;
-  series.forEach(a => meses.forEach(m => { tot += (metricDict[a]?.[m] || 0); }));
-  return tot;
-}
-function metaSelected(metasDict){
-  const series = DATA.series.filter(a => SELECTED.size ? SELECTED.has(a) : true);
-  return series.reduce((s,a)=> s + (metasDict[a] || 0), 0);
-}
-function pct(a,b){ if(!b || b<=0) return 0; return Math.max(0, Math.min(100, (a/b)*100)); }
-
-function updateMainCards(){
-  const ativ = sumSelected(DATA.ativacoes);
-  const metaA = metaSelected(DATA.metas.ativacoes);
-  const pA = pct(ativ, metaA);
-
-  const capt = sumSelected(DATA.captacao);
-  const metaC = metaSelected(DATA.metas.captacao);
-  const pC = pct(capt, metaC);
-
-  const rece = sumSelected(DATA.receita);
-  const metaR = metaSelected(DATA.metas.receita);
-  const pR = pct(rece, metaR);
-
-  el('valAtiv').textContent = ativ.toLocaleString('pt-BR');
-  el('metaAtiv').textContent = metaA.toLocaleString('pt-BR');
-  el('pctAtiv').textContent = (pA||0).toFixed(0) + '%';
-  el('barAtiv').style.width = (pA||0).toFixed(0) + '%';
-
-  el('valCapt').textContent = fmtRS(capt);
-  el('metaCapt').textContent = fmtRS(metaC);
-  el('pctCapt').textContent = (pC||0).toFixed(0) + '%';
-  el('barCapt').style.width = (pC||0).toFixed(0) + '%';
-
-  el('valRece').textContent = fmtRS(rece);
-  el('metaRece').textContent = fmtRS(metaR);
-  el('pctRece').textContent = (pR||0).toFixed(0) + '%';
-  el('barRece').style.width = (pR||0).toFixed(0) + '%';
-}
-
-function lineStyleFor(count){ return count <= 6 ? {shape:'spline', smoothing:0.6, width:2.4} : {shape:'linear', width:2}; }
-function maybeFillFor(count){ return count <= 3 ? 'tozeroy' : 'none'; }
-
-function plotMetric(metric, series, meses, payload, targetDiv){
-  const mesesTicks = meses.map(m => ({ "2025-01":"Jan","2025-02":"Fev","2025-03":"Mar","2025-04":"Abr","2025-05":"Mai","2025-06":"Jun","2025-07":"Jul","2025-08":"Ago","2025-09":"Set","2025-10":"Out","2025-11":"Nov","2025-12":"Dez" }[m] || m));
-  const dados    = payload[metric];
-  const isAtiv   = metric === 'ativacoes';
-  const axisTitle= isAtiv ? 'Ativações (unid.)' : (metric==='captacao' ? 'Captação (R$)' : 'Receita (R$)');
-  const lconf = lineStyleFor(series.length);
-  const fill  = maybeFillFor(series.length);
-
-  let traces;
-  if(CHART_MODE === 'bar'){
-    traces = series.map(a => ({
-      x: meses, y: meses.map(m => dados[a]?.[m]||0), type: 'bar', name: a,
-      marker: { line:{width:0}, opacity:.92 },
-      hovertemplate: `<b>${a}</b><br>%{x}<br>` + (isAtiv ? 'Ativações: %{y}' : 'R$ %{y:,.2f}') + `<extra></extra>`
-    }));
-  } else {
-    traces = series.map(a => ({
-      x: meses, y: meses.map(m => dados[a]?.[m]||0),
-      type:'scatter', mode:'lines+markers', name:a, line:lconf, marker:{size:6, opacity:.95}, fill:fill,
-      hovertemplate:`<b>${a}</b><br>%{x}<br>` + (isAtiv ? 'Ativações: %{y}' : 'R$ %{y:,.2f}') + `<extra></extra>`
-    }));
-  }
-
-  const totalPorMes = meses.map(m => { let s=0; series.forEach(a => s += (dados[a]?.[m]||0)); return s; });
-  const layout = {
-    ...BASE_LAYOUT,
-    yaxis:{...BASE_LAYOUT.yaxis, title: axisTitle, titlefont:{size:12}},
-    xaxis:{...BASE_LAYOUT.xaxis, tickmode:'array', tickvals: meses, ticktext: mesesTicks},
-    barmode: CHART_MODE==='bar' ? 'relative' : undefined,
-    annotations: [{
-      xref:'paper', yref:'paper', x:1, y:1.18, xanchor:'right', yanchor:'top',
-      text:`Total Selecionado: <b>${
-        (isAtiv ? totalPorMes.reduce((a,b)=>a+b,0).toLocaleString('pt-BR')
-                : totalPorMes.reduce((a,b)=>a+b,0).toLocaleString('pt-BR',{style:'currency',currency:'BRL'}))
-      }</b>`, showarrow:false, font:{size:12, color:'#b9c6ff'}
-    }]
-  };
-
-  Plotly.react(targetDiv, traces, layout, {
-    displayModeBar:true, responsive:true,
-    modeBarButtonsToRemove:['lasso2d','select2d','toggleSpikelines','autoScale2d','hoverCompareCartesian'],
-    displaylogo:false, toImageButtonOptions:{format:'png', filename:`${metric}_positivadores_2025`}
-  });
-  Plotly.animate(targetDiv, {data: traces},{transition:{duration:300, easing:'cubic-in-out'}, frame:{duration:300}});
-  window.addEventListener('resize', () => Plotly.Plots.resize(targetDiv));
-}
-
-/* ===== NOVA VERSÃO: tabela sem coluna AAAA-MM, com colgroup e sticky ===== */
-function buildDetailsTable(){
-  const target = el('tbl');
-  const rows = (DATA.detalhes || []).filter(d => SELECTED.size ? SELECTED.has(d.assessor) : true);
-
-  const colgroup = `
-    <colgroup>
-      <col style="width:220px">   <!-- Assessor (fixa) -->
-      <col style="width:260px">   <!-- Cliente  (fixa) -->
-      <col>                       <!-- Ativou em M? -->
-      <col>                       <!-- Evadiu em M? -->
-      <col>                       <!-- Net em M -->
-      <col>                       <!-- Receita no Mês -->
-      <col>                       <!-- Captação Líquida em M -->
-      <col style="width:120px">   <!-- Mês (nome) -->
-    </colgroup>
-  `;
-
-  let html = `
-    <table>
-      ${colgroup}
-      <thead>
-        <tr>
-          <th>Assessor</th>
-          <th>Cliente</th>
-          <th>Ativou em M?</th>
-          <th>Evadiu em M?</th>
-          <th>Net em M</th>
-          <th>Receita no Mês</th>
-          <th>Captação Líquida em M</th>
-          <th>Mês</th>
-        </tr>
-      </thead>
-      <tbody>
-  `;
-
-  for(const r of rows){
-    html += `<tr>
-      <td>${r.assessor||''}</td>
-      <td>${r.cliente||''}</td>
-      <td>${r.ativou_em_m}</td>
-      <td>${r.evadiu_em_m}</td>
-      <td>${Number(r.net_em_m||0).toLocaleString('pt-BR',{minimumFractionDigits:2,maximumFractionDigits:2})}</td>
-      <td>${Number(r.receita_no_mes||0).toLocaleString('pt-BR',{minimumFractionDigits:2,maximumFractionDigits:2})}</td>
-      <td>${Number(r.captacao_liquida_em_m||0).toLocaleString('pt-BR',{minimumFractionDigits:2,maximumFractionDigits:2})}</td>
-      <td>${r.mes_nome}</td>
-    </tr>`;
-  }
-
-  html += '</tbody></table>';
-  target.innerHTML = html;
-}
-
-function mountCSVLink(){
-  const list = [...SELECTED];
-  const q = list.length ? '?assessores='+encodeURIComponent(list.join(',')) : '';
-  el('btnCSV').href = '/api/metricas_csv'+q;
-}
-
-async function refresh(){
-  document.body.classList.add('loading');
-  DATA = await fetchPayload();
-  const series = DATA.series.filter(a => SELECTED.size ? SELECTED.has(a) : true);
-  const meses = DATA.meses;
-
-  // Cards e Gráficos
-  updateMainCards();
-  const payload = { ativacoes: DATA.ativacoes, captacao: DATA.captacao, receita: DATA.receita };
-  plotMetric('ativacoes', series, meses, payload, 'chartAtiv');
-  plotMetric('captacao',  series, meses, payload, 'chartCapt');
-  plotMetric('receita',   series, meses, payload, 'chartRece');
-
-  // Tabela de DETALHES (linhas da AWS) - sem AAAA-MM
-  buildDetailsTable();
-
-  mountCSVLink();
-  document.body.classList.remove('loading');
-}
-
-(async function init(){
-  ALL_ASSESSORES = await fetchAssessores();
-  renderDropdown(''); renderChips(); await refresh();
-
-  el('assSearch').addEventListener('focus', () => renderDropdown(el('assSearch').value));
-  el('assSearch').addEventListener('input', (e)=> renderDropdown(e.target.value));
-  document.addEventListener('click', (e)=>{ const sel = el('assSel'); if(!sel.contains(e.target)) show(el('assDrop'), false); });
-  el('assSel').addEventListener('click', (e)=>{
-    const opt = e.target.closest('.opt');
-    if(opt && opt.dataset.value){
-      const v = opt.dataset.value;
-      if(SELECTED.has(v)) SELECTED.delete(v); else SELECTED.add(v);
-      renderDropdown(el('assSearch').value); renderChips(); refresh();
-    }
-  });
-
-  el('btnAll').addEventListener('click', ()=>{ ALL_ASSESSORES.forEach(a=>SELECTED.add(a)); renderDropdown(el('assSearch').value); renderChips(); refresh(); });
-  el('btnClear').addEventListener('click', ()=>{ SELECTED.clear(); renderDropdown(el('assSearch').value); renderChips(); refresh(); });
-
-  el('segLine').addEventListener('click', ()=>{ CHART_MODE='line'; refresh(); });
-  el('segBar').addEventListener('click',  ()=>{ CHART_MODE='bar';  refresh(); });
-})();
-</script>
-</body></html>
-"""
+@app.get("/", response_class=HTMLResponse)
+def index(request: Request):
+    return servir_asset(request, INDEX_ASSET, "no-cache")
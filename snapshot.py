@@ -0,0 +1,281 @@
+# snapshot.py
+"""Snapshot compartilhado entre workers (gunicorn/uvicorn).
+
+Um único worker (o que pega o flock) lê as tabelas do banco e publica o
+dataset normalizado num arquivo binário colunar, trocado de forma atômica
+com os.replace. Os demais workers só fazem mmap (somente leitura) do arquivo
+e leem as colunas via memoryview, sem copiar: as páginas ficam no page cache
+(ou em /dev/shm) uma vez só, independentemente do número de workers.
+
+Layout do arquivo:
+    MAGIC (8 bytes) | tamanho do header (uint64) | header JSON | colunas
+O header guarda versão, data de geração, lista de tabelas (com o digest do
+conteúdo de cada uma) e, para cada coluna, (offset, typecode, quantidade).
+Cada coluna começa alinhada em 8 bytes.
+"""
+from array import array
+from bisect import bisect_left
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
+import fcntl
+import hashlib
+import json
+import logging
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+MAGIC = b"PSNAP02\0"
+_HDR = struct.Struct("<Q")
+
+ATIVOU = 1
+EVADIU = 2
+
+class TabelaBruta(NamedTuple):
+    nome: str
+    mes: str
+    linhas: List[Tuple[str, int, float, float]]                         # assessor, ativ, capt, rece
+    detalhes: List[Tuple[str, str, bool, bool, float, float, float]]    # assessor, cliente, ativou, evadiu, net, rece, capt
+
+def _pad8(n: int) -> int:
+    return (n + 7) & ~7
+
+def digest_tabela(t: TabelaBruta) -> str:
+    """Digest do conteúdo da tabela, independente da ordem das linhas vinda do banco."""
+    h = hashlib.blake2b(digest_size=8)
+    for r in sorted(t.linhas):
+        h.update(repr(r).encode("utf-8"))
+    h.update(b"|")
+    for r in sorted(t.detalhes):
+        h.update(repr(r).encode("utf-8"))
+    return h.hexdigest()
+
+def escrever_snapshot(caminho: str, tabelas: List[TabelaBruta]) -> str:
+    """Grava o snapshot em arquivo temporário e publica com os.replace. Devolve a versão."""
+    textos = sorted({r[0] for t in tabelas for r in t.linhas} |
+                    {s for t in tabelas for r in t.detalhes for s in (r[0], r[1])})
+    sid = {s: i for i, s in enumerate(textos)}
+    blob = bytearray()
+    s_off = array("Q", [0])
+    for s in textos:
+        blob += s.encode("utf-8")
+        s_off.append(len(blob))
+
+    l_tab, l_ass, l_ativ, l_capt, l_rece = array("H"), array("I"), array("q"), array("d"), array("d")
+    d_tab, d_ass, d_cli, d_flags = array("H"), array("I"), array("I"), array("B")
+    d_net, d_rece, d_capt = array("d"), array("d"), array("d")
+    meta_tabelas = []
+    for ti, t in enumerate(tabelas):
+        l0, d0 = len(l_ass), len(d_ass)
+        for ass, ativ, capt, rece in t.linhas:
+            l_tab.append(ti); l_ass.append(sid[ass]); l_ativ.append(int(ativ))
+            l_capt.append(float(capt)); l_rece.append(float(rece))
+        for ass, cli, ativou, evadiu, net, rece, capt in t.detalhes:
+            d_tab.append(ti); d_ass.append(sid[ass]); d_cli.append(sid[cli])
+            d_flags.append((ATIVOU if ativou else 0) | (EVADIU if evadiu else 0))
+            d_net.append(float(net)); d_rece.append(float(rece)); d_capt.append(float(capt))
+        meta_tabelas.append({"nome": t.nome, "mes": t.mes, "digest": digest_tabela(t),
+                             "linhas": [l0, len(l_ass)], "detalhes": [d0, len(d_ass)]})
+
+    # índice cliente -> linhas de detalhe, ordenadas por mês
+    meses_tab = [t.mes for t in tabelas]
+    c_ord = array("I", sorted(range(len(d_cli)), key=lambda r: (d_cli[r], meses_tab[d_tab[r]], r)))
+    c_ini = array("I", [0] * (len(textos) + 1))
+    for c in d_cli:
+        c_ini[c + 1] += 1
+    for i in range(len(textos)):
+        c_ini[i + 1] += c_ini[i]
+
+    colunas: Dict[str, array] = {
+        "s_off": s_off, "s_blob": array("B", bytes(blob)),
+        "l_tab": l_tab, "l_ass": l_ass, "l_ativ": l_ativ, "l_capt": l_capt, "l_rece": l_rece,
+        "d_tab": d_tab, "d_ass": d_ass, "d_cli": d_cli, "d_flags": d_flags,
+        "d_net": d_net, "d_rece": d_rece, "d_capt": d_capt,
+        "c_ord": c_ord, "c_ini": c_ini,
+    }
+    dados = bytearray()
+    layout = {}
+    for nome, arr in colunas.items():
+        layout[nome] = [len(dados), arr.typecode, len(arr)]
+        dados += arr.tobytes()
+        dados += b"\0" * (_pad8(len(dados)) - len(dados))
+
+    versao = hashlib.blake2b(bytes(dados), digest_size=8).hexdigest()
+    assessores = sorted({textos[i] for i in d_ass} | {textos[i] for i in l_ass})
+    header = json.dumps({
+        "versao": versao, "gerado_em": time.time(), "byteorder": sys.byteorder,
+        "tabelas": meta_tabelas, "assessores": assessores, "colunas": layout,
+    }).encode("utf-8")
+    inicio = _pad8(len(MAGIC) + _HDR.size + len(header))
+
+    tmp = f"{caminho}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(MAGIC); f.write(_HDR.pack(len(header))); f.write(header)
+        f.write(b"\0" * (inicio - (len(MAGIC) + _HDR.size + len(header))))
+        f.write(dados)
+    os.replace(tmp, caminho)
+    return versao
+
+class Snapshot:
+    """Visão somente leitura (mmap) de um snapshot publicado."""
+
+    def __init__(self, caminho: str):
+        with open(caminho, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        mv = memoryview(self._mm)
+        if bytes(mv[:len(MAGIC)]) != MAGIC:
+            raise RuntimeError(f"Snapshot inválido: {caminho}")
+        (n,) = _HDR.unpack_from(self._mm, len(MAGIC))
+        p = len(MAGIC) + _HDR.size
+        h = json.loads(bytes(mv[p:p + n]).decode("utf-8"))
+        if h["byteorder"] != sys.byteorder:
+            raise RuntimeError(f"Snapshot com byteorder diferente: {caminho}")
+        inicio = _pad8(p + n)
+        self.versao: str = h["versao"]
+        self.gerado_em: float = h["gerado_em"]
+        self.tabelas: List[dict] = h["tabelas"]
+        self.assessores: List[str] = h["assessores"]
+        # colunas viram atributos (self.d_net, self.c_ord, ...) apontando direto para o mmap
+        for nome, (off, tc, qtd) in h["colunas"].items():
+            tam = array(tc).itemsize * qtd
+            setattr(self, nome, mv[inicio + off:inicio + off + tam].cast(tc))
+
+    def idade(self) -> float:
+        return time.time() - self.gerado_em
+
+    def texto(self, i: int) -> str:
+        o = self.s_off
+        return bytes(self.s_blob[o[i]:o[i + 1]]).decode("utf-8")
+
+    def id_texto(self, s: str) -> Optional[int]:
+        # textos gravados em ordem: busca binária sobre o blob
+        n = len(self.s_off) - 1
+        i = bisect_left(range(n), s, key=self.texto)
+        return i if i < n and self.texto(i) == s else None
+
+    def linhas(self, ti: int) -> Iterator[Tuple[str, int, float, float]]:
+        a, b = self.tabelas[ti]["linhas"]
+        for r in range(a, b):
+            yield self.texto(self.l_ass[r]), self.l_ativ[r], self.l_capt[r], self.l_rece[r]
+
+    def _detalhe(self, r: int):
+        fl = self.d_flags[r]
+        return (self.texto(self.d_ass[r]), self.texto(self.d_cli[r]),
+                bool(fl & ATIVOU), bool(fl & EVADIU),
+                self.d_net[r], self.d_rece[r], self.d_capt[r])
+
+    def detalhes(self, ti: int) -> Iterator[Tuple[str, str, bool, bool, float, float, float]]:
+        a, b = self.tabelas[ti]["detalhes"]
+        for r in range(a, b):
+            yield self._detalhe(r)
+
+    def detalhes_cliente(self, cliente: str) -> Iterator[Tuple[str, Tuple]]:
+        """(mes, detalhe) de todas as linhas do cliente, em ordem de mês."""
+        c = self.id_texto(cliente)
+        if c is None:
+            return
+        for k in range(self.c_ini[c], self.c_ini[c + 1]):
+            r = self.c_ord[k]
+            yield self.tabelas[self.d_tab[r]]["mes"], self._detalhe(r)
+
+class SnapshotCompartilhado:
+    """Snapshot por processo que acompanha o arquivo publicado.
+
+    atual() troca para a versão nova quando o arquivo muda (novo inode) e,
+    se estiver vencida (mais velha que ttl), dispara a reconstrução numa
+    thread em segundo plano: só o worker que obtém o flock consulta o banco,
+    e todas as requisições (inclusive a que disparou) seguem com a versão
+    atual. Só se espera a construção quando ainda não existe snapshot algum.
+
+    Se construir() falhar, o erro é registrado no log e a versão atual
+    continua sendo servida; o instante da próxima tentativa fica gravado no
+    arquivo de lock, para que todos os workers esperem espera_falha segundos
+    antes de consultar o banco de novo. Só há erro para o chamador quando
+    ainda não existe snapshot algum.
+    """
+
+    def __init__(self, caminho: str, construir: Callable[[], List[TabelaBruta]], ttl: float,
+                 espera_falha: float = 30.0):
+        self.caminho = caminho
+        self.construir = construir
+        self.ttl = ttl
+        self.espera_falha = espera_falha
+        self._snap: Optional[Snapshot] = None
+        self._ident: Optional[Tuple[int, int]] = None
+        self._lock = threading.Lock()
+        self._tentar_apos = 0.0   # cópia local do instante gravado no lock
+        self._reconstrutor: Optional[threading.Thread] = None
+
+    def _recarregar(self) -> Optional[Snapshot]:
+        with self._lock:
+            try:
+                st = os.stat(self.caminho)
+            except FileNotFoundError:
+                return self._snap
+            ident = (st.st_ino, st.st_mtime_ns)
+            if ident != self._ident:
+                try:
+                    self._snap = Snapshot(self.caminho)
+                except RuntimeError:
+                    # arquivo de outro formato (p.ex. deixado por uma versão anterior): trata como ausente
+                    log.warning("Ignorando snapshot inválido %s", self.caminho, exc_info=True)
+                    return self._snap
+                self._ident = ident
+            return self._snap
+
+    def _publicar(self, esperar: bool) -> None:
+        with open(self.caminho + ".lock", "a+") as f:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | (0 if esperar else fcntl.LOCK_NB))
+            except BlockingIOError:
+                return
+            try:
+                # outro worker pode ter publicado enquanto esperávamos o lock
+                snap = self._recarregar()
+                if snap is not None and snap.idade() <= self.ttl:
+                    return
+                f.seek(0)
+                try:
+                    self._tentar_apos = float(f.read().strip() or 0)
+                except ValueError:
+                    self._tentar_apos = 0.0
+                if time.time() < self._tentar_apos:
+                    return
+                try:
+                    escrever_snapshot(self.caminho, self.construir())
+                except Exception:
+                    self._tentar_apos = time.time() + self.espera_falha
+                    f.truncate(0); f.write(repr(self._tentar_apos)); f.flush()
+                    if snap is None:
+                        raise
+                    log.exception("Falha ao reconstruir o snapshot %s; mantendo a versão %s (nova tentativa em %.0fs)",
+                                  self.caminho, snap.versao, self.espera_falha)
+                    return
+                f.truncate(0)
+                self._tentar_apos = 0.0
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _reconstruir_em_segundo_plano(self):
+        with self._lock:
+            if self._reconstrutor is not None and self._reconstrutor.is_alive():
+                return
+            self._reconstrutor = threading.Thread(target=self._publicar, args=(False,),
+                                                  name="snapshot-rebuild", daemon=True)
+            self._reconstrutor.start()
+
+    def atual(self) -> Snapshot:
+        snap = self._recarregar()
+        if snap is None:
+            self._publicar(esperar=True)
+            snap = self._recarregar()
+        elif snap.idade() > self.ttl and time.time() >= self._tentar_apos:
+            self._reconstruir_em_segundo_plano()
+        if snap is None:
+            raise RuntimeError(f"Snapshot indisponível: {self.caminho} "
+                               f"(última tentativa falhou; nova tentativa após {self._tentar_apos:.0f})")
+        return snap
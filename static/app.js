@@ -0,0 +1,418 @@
+let ALL_ASSESSORES = [];
+let SELECTED = new Set();
+let CHART_MODE = 'line';
+let DATA = null;
+let DATA_KEY = null;   // filtro com que DATA foi carregado (patch só vale p/ o mesmo filtro)
+const POLL_MS = 60000; // dashboards abertos buscam só o delta
+let LOAD_SEQ = 0;      // cada carga (refresh/poll) ganha um número; respostas de cargas antigas são descartadas
+let CARREGANDO = 0;    // cargas em andamento: o polling espera terminarem
+let LOAD_CTRL = null;  // AbortController da carga mais recente
+
+// Começa uma carga: cancela a anterior (o servidor para de gerar o stream) e devolve {seq, signal}
+function novaCarga(){
+  if(LOAD_CTRL) LOAD_CTRL.abort();
+  LOAD_CTRL = new AbortController();
+  return {seq: ++LOAD_SEQ, signal: LOAD_CTRL.signal};
+}
+
+const COLORWAY = [
+  '#82aaff','#5ad6b0','#ffd166','#ef476f','#06d6a0',
+  '#f78c6b','#c792ea','#29b6f6','#ff9f1c','#8bd450',
+  '#64b5f6','#9ccc65','#ffb74d','#ba68c8'
+];
+
+const BASE_LAYOUT = {
+  paper_bgcolor:'#121424',
+  plot_bgcolor:'#121424',
+  font:{color:'#e6e9ff', family:'Inter, system-ui, Segoe UI, Roboto, Arial, sans-serif', size:12},
+  margin:{l:56,r:14,t:6,b:40},
+  hovermode:'x unified',
+  hoverlabel:{bgcolor:'#0e1020', bordercolor:'#2b3353', font:{size:12}},
+  legend:{orientation:'h', y:1.08, x:0, xanchor:'left', bgcolor:'rgba(14,16,32,.6)', bordercolor:'#2b3353', borderwidth:1, font:{size:11}},
+  xaxis:{title:'Mês', tickangle:0, gridcolor:'#26304b', zerolinecolor:'#2c3656', linecolor:'#2b3353', tickfont:{size:11}},
+  yaxis:{gridcolor:'#26304b', zerolinecolor:'#2c3656', linecolor:'#2b3353', tickfont:{size:11}},
+  colorway: COLORWAY
+};
+
+function el(id){ return document.getElementById(id); }
+function show(e,b){ e.style.display = b ? 'block':'none'; }
+
+async function fetchAssessores(){ const r = await fetch('/api/assessores'); return await r.json(); }
+function selectedKey(){ return [...SELECTED].sort().join(','); }
+
+// Com versão em mãos: patch via /api/metricas. Sem: carga progressiva via /api/metricas_stream.
+// Devolve {key, data}; quem chama decide se a resposta ainda vale (filtro pode ter mudado).
+async function fetchPayload(onMes = () => {}, signal){
+  const key = selectedKey();
+  const params = new URLSearchParams();
+  if(key) params.set('assessores', key);
+  const patching = DATA && DATA.versao && DATA_KEY === key;
+  if(patching) params.set('versao', DATA.versao);
+  const query = params.toString() ? '?'+params.toString() : '';
+  if(!patching) return {key, data: await fetchStream(query, onMes, signal)};
+  const r = await fetch('/api/metricas'+query, {signal});
+  if(!r.ok) throw new Error(`metricas: HTTP ${r.status}`);
+  const body = await r.json();
+  return {key, data: ('base' in body) ? applyPatch(DATA, body) : body};
+}
+
+// Lê o NDJSON mês a mês, chamando onMes(data parcial) a cada registro
+async function fetchStream(query, onMes, signal){
+  const data = { series:[], meses:[], ativacoes:{}, captacao:{}, receita:{},
+                 metas:{ativacoes:{}, captacao:{}, receita:{}}, tabela:[], detalhes:[], versao:'' };
+  const vistos = new Set();
+  let fim = false;
+  const handle = (line) => {
+    if(!line.trim()) return;
+    const rec = JSON.parse(line);
+    if(rec.tipo === 'mes'){
+      for(const metric of ['ativacoes','captacao','receita']){
+        for(const [a, v] of Object.entries(rec[metric])){ (data[metric][a] ||= {})[rec.mes] = v; vistos.add(a); }
+      }
+      data.meses.push(rec.mes);
+      data.series = [...vistos].sort();
+      data.tabela = data.tabela.concat(rec.tabela);
+      data.detalhes = data.detalhes.concat(rec.detalhes);
+      onMes(data, rec);
+    } else if(rec.tipo === 'fim'){
+      fim = true;
+      data.series = rec.series; data.meses = rec.meses; data.metas = rec.metas; data.versao = rec.versao;
+    }
+  };
+  const r = await fetch('/api/metricas_stream'+query, {signal});
+  if(!r.ok) throw new Error(`metricas_stream: HTTP ${r.status}`);
+  const reader = r.body.getReader();
+  const dec = new TextDecoder();
+  let buf = '';
+  for(;;){
+    const {done, value} = await reader.read();
+    if(done) break;
+    buf += dec.decode(value, {stream:true});
+    const lines = buf.split('\n');
+    buf = lines.pop();
+    lines.forEach(handle);
+  }
+  handle(buf + dec.decode());
+  if(!fim) throw new Error('metricas_stream: resposta incompleta (sem registro final)');
+  return data;
+}
+
+// Aplica o patch de /api/metricas?versao=... sobre uma cópia do DATA atual
+function applyPatch(base, p){
+  if(p.versao === base.versao && !p.meses_alterados.length) return base;  // nada mudou
+  const data = {...base};
+  const alt = new Set(p.meses_alterados);
+  const vivos = new Set(p.meses);
+  const keep = m => vivos.has(m) && !alt.has(m);
+  for(const metric of ['ativacoes','captacao','receita']){
+    const out = {};
+    for(const a of p.series){
+      const antigo = data[metric][a] || {};
+      const novo = p[metric][a] || {};
+      const linha = {};
+      for(const m of p.meses){ linha[m] = alt.has(m) ? (novo[m] || 0) : (antigo[m] || 0); }
+      out[a] = linha;
+    }
+    data[metric] = out;
+  }
+  data.tabela   = data.tabela.filter(l => keep(l.mes)).concat(p.tabela);
+  data.detalhes = data.detalhes.filter(d => keep(d.mes)).concat(p.detalhes);
+  data.series = p.series; data.meses = p.meses; data.metas = p.metas; data.versao = p.versao;
+  return data;
+}
+
+function renderDropdown(filter=''){
+  const box = el('assDrop');
+  const f = filter.trim().toLowerCase();
+  const arr = f ? ALL_ASSESSORES.filter(a => a.toLowerCase().includes(f)) : ALL_ASSESSORES.slice(0,600);
+  box.innerHTML = arr.map(a => {
+    const checked = SELECTED.has(a) ? '✓' : '';
+    return `<div class="opt" data-value="${a}">
+              <div style="width:18px;text-align:center">${checked}</div>
+              <div>${a}</div>
+            </div>`;
+  }).join('') || `<div class="opt muted">Nenhum encontrado</div>`;
+  show(box, true);
+}
+function renderChips(){
+  const chips = el('chips'); const list = [...SELECTED].sort();
+  chips.innerHTML = list.slice(0,30).map(a => `<span class="chip">${a}</span>`).join('') +
+                    (list.length>30 ? `<span class="chip">+${list.length-30}</span>`:'');
+}
+
+function fmtRS(v){ return v.toLocaleString('pt-BR',{style:'currency',currency:'BRL'}); }
+function fmtNum(v){ return v.toLocaleString('pt-BR',{minimumFractionDigits:2, maximumFractionDigits:2}); }
+
+function sumSelected(metricDict){
+  const series = DATA.series.filter(isSelected);
+  const meses = DATA.meses;
+  let tot = 0;
+  series.forEach(a => meses.forEach(m => { tot += (metricDict[a]?.[m] || 0); }));
+  return tot;
+}
+function metaSelected(metasDict){
+  const series = DATA.series.filter(isSelected);
+  return series.reduce((s,a)=> s + (metasDict[a] || 0), 0);
+}
+function pct(a,b){ if(!b || b<=0) return 0; return Math.max(0, Math.min(100, (a/b)*100)); }
+
+function updateMainCards(){
+  setCards(
+    {ativacoes: sumSelected(DATA.ativacoes), captacao: sumSelected(DATA.captacao), receita: sumSelected(DATA.receita)},
+    {ativacoes: metaSelected(DATA.metas.ativacoes), captacao: metaSelected(DATA.metas.captacao), receita: metaSelected(DATA.metas.receita)}
+  );
+}
+
+// metas = null enquanto o stream não terminou (metas só chegam no registro final)
+function setCards(tot, metas){
+  const pA = metas ? pct(tot.ativacoes, metas.ativacoes) : 0;
+  const pC = metas ? pct(tot.captacao, metas.captacao) : 0;
+  const pR = metas ? pct(tot.receita, metas.receita) : 0;
+
+  el('valAtiv').textContent = tot.ativacoes.toLocaleString('pt-BR');
+  el('metaAtiv').textContent = metas ? metas.ativacoes.toLocaleString('pt-BR') : '—';
+  el('pctAtiv').textContent = metas ? (pA||0).toFixed(0) + '%' : '—';
+  el('barAtiv').style.width = (pA||0).toFixed(0) + '%';
+
+  el('valCapt').textContent = fmtRS(tot.captacao);
+  el('metaCapt').textContent = metas ? fmtRS(metas.captacao) : '—';
+  el('pctCapt').textContent = metas ? (pC||0).toFixed(0) + '%' : '—';
+  el('barCapt').style.width = (pC||0).toFixed(0) + '%';
+
+  el('valRece').textContent = fmtRS(tot.receita);
+  el('metaRece').textContent = metas ? fmtRS(metas.receita) : '—';
+  el('pctRece').textContent = metas ? (pR||0).toFixed(0) + '%' : '—';
+  el('barRece').style.width = (pR||0).toFixed(0) + '%';
+}
+
+function lineStyleFor(count){ return count <= 6 ? {shape:'spline', smoothing:0.6, width:2.4} : {shape:'linear', width:2}; }
+function maybeFillFor(count){ return count <= 3 ? 'tozeroy' : 'none'; }
+
+const MES_TICK = { "2025-01":"Jan","2025-02":"Fev","2025-03":"Mar","2025-04":"Abr","2025-05":"Mai","2025-06":"Jun","2025-07":"Jul","2025-08":"Ago","2025-09":"Set","2025-10":"Out","2025-11":"Nov","2025-12":"Dez" };
+const CHART_DIVS = { ativacoes:'chartAtiv', captacao:'chartCapt', receita:'chartRece' };
+
+function makeTrace(metric, a, meses, dados, count){
+  const isAtiv = metric === 'ativacoes';
+  const hovertemplate = `<b>${a}</b><br>%{x}<br>` + (isAtiv ? 'Ativações: %{y}' : 'R$ %{y:,.2f}') + `<extra></extra>`;
+  const y = meses.map(m => dados[a]?.[m]||0);
+  if(CHART_MODE === 'bar'){
+    return { x: meses, y, type: 'bar', name: a, marker: { line:{width:0}, opacity:.92 }, hovertemplate };
+  }
+  return { x: meses, y, type:'scatter', mode:'lines+markers', name:a, line:lineStyleFor(count),
+           marker:{size:6, opacity:.95}, fill:maybeFillFor(count), hovertemplate };
+}
+
+function plotMetric(metric, series, meses, payload, targetDiv){
+  const mesesTicks = meses.map(m => MES_TICK[m] || m);
+  const dados    = payload[metric];
+  const isAtiv   = metric === 'ativacoes';
+  const axisTitle= isAtiv ? 'Ativações (unid.)' : (metric==='captacao' ? 'Captação (R$)' : 'Receita (R$)');
+  const traces = series.map(a => makeTrace(metric, a, meses, dados, series.length));
+
+  const totalPorMes = meses.map(m => { let s=0; series.forEach(a => s += (dados[a]?.[m]||0)); return s; });
+  const layout = {
+    ...BASE_LAYOUT,
+    yaxis:{...BASE_LAYOUT.yaxis, title: axisTitle, titlefont:{size:12}},
+    xaxis:{...BASE_LAYOUT.xaxis, tickmode:'array', tickvals: meses, ticktext: mesesTicks},
+    barmode: CHART_MODE==='bar' ? 'relative' : undefined,
+    annotations: [{
+      xref:'paper', yref:'paper', x:1, y:1.18, xanchor:'right', yanchor:'top',
+      text:`Total Selecionado: <b>${
+        (isAtiv ? totalPorMes.reduce((a,b)=>a+b,0).toLocaleString('pt-BR')
+                : totalPorMes.reduce((a,b)=>a+b,0).toLocaleString('pt-BR',{style:'currency',currency:'BRL'}))
+      }</b>`, showarrow:false, font:{size:12, color:'#b9c6ff'}
+    }]
+  };
+
+  Plotly.react(targetDiv, traces, layout, {
+    displayModeBar:true, responsive:true,
+    modeBarButtonsToRemove:['lasso2d','select2d','toggleSpikelines','autoScale2d','hoverCompareCartesian'],
+    displaylogo:false, toImageButtonOptions:{format:'png', filename:`${metric}_positivadores_2025`}
+  });
+  Plotly.animate(targetDiv, {data: traces},{transition:{duration:300, easing:'cubic-in-out'}, frame:{duration:300}});
+}
+
+/* ===== NOVA VERSÃO: tabela sem coluna AAAA-MM, com colgroup e sticky ===== */
+function detailRowHtml(r){
+  return `<tr>
+      <td>${r.assessor||''}</td>
+      <td>${r.cliente||''}</td>
+      <td>${r.ativou_em_m}</td>
+      <td>${r.evadiu_em_m}</td>
+      <td>${Number(r.net_em_m||0).toLocaleString('pt-BR',{minimumFractionDigits:2,maximumFractionDigits:2})}</td>
+      <td>${Number(r.receita_no_mes||0).toLocaleString('pt-BR',{minimumFractionDigits:2,maximumFractionDigits:2})}</td>
+      <td>${Number(r.captacao_liquida_em_m||0).toLocaleString('pt-BR',{minimumFractionDigits:2,maximumFractionDigits:2})}</td>
+      <td>${r.mes_nome}</td>
+    </tr>`;
+}
+
+// Stream: acrescenta só as linhas do mês novo no tbody existente
+function appendDetailRows(rows){
+  el('tbl').querySelector('tbody').insertAdjacentHTML('beforeend', rows.map(detailRowHtml).join(''));
+}
+
+function buildDetailsTable(rows = (DATA.detalhes || []).filter(d => isSelected(d.assessor))){
+  const target = el('tbl');
+
+  const colgroup = `
+    <colgroup>
+      <col style="width:220px">   <!-- Assessor (fixa) -->
+      <col style="width:260px">   <!-- Cliente  (fixa) -->
+      <col>                       <!-- Ativou em M? -->
+      <col>                       <!-- Evadiu em M? -->
+      <col>                       <!-- Net em M -->
+      <col>                       <!-- Receita no Mês -->
+      <col>                       <!-- Captação Líquida em M -->
+      <col style="width:120px">   <!-- Mês (nome) -->
+    </colgroup>
+  `;
+
+  let html = `
+    <table>
+      ${colgroup}
+      <thead>
+        <tr>
+          <th>Assessor</th>
+          <th>Cliente</th>
+          <th>Ativou em M?</th>
+          <th>Evadiu em M?</th>
+          <th>Net em M</th>
+          <th>Receita no Mês</th>
+          <th>Captação Líquida em M</th>
+          <th>Mês</th>
+        </tr>
+      </thead>
+      <tbody>
+  `;
+
+  html += rows.map(detailRowHtml).join('');
+  html += '</tbody></table>';
+  target.innerHTML = html;
+}
+
+function mountCSVLink(){
+  const list = [...SELECTED];
+  const q = list.length ? '?assessores='+encodeURIComponent(list.join(',')) : '';
+  el('btnCSV').href = '/api/metricas_csv'+q;
+}
+
+async function refresh(){
+  const {seq, signal} = novaCarga();
+  const anterior = DATA, anteriorKey = DATA_KEY;
+  CARREGANDO++;
+  document.body.classList.add('loading');
+  try{
+    const st = {};  // estado da renderização incremental do stream
+    const {key, data} = await fetchPayload((parcial, rec) => {
+      if(seq !== LOAD_SEQ) return;
+      DATA = parcial; renderMes(rec, st);
+      document.body.classList.remove('loading');
+    }, signal);
+    if(seq !== LOAD_SEQ || key !== selectedKey()) return;  // resposta de um filtro antigo
+    DATA = data; DATA_KEY = key;
+    el('status').textContent = '';
+    render({tabela: !st.iniciado});  // tabela já foi montada mês a mês pelo stream
+  } catch(e){
+    // falha: volta ao DATA anterior (os parciais do stream não valem)
+    if(e.name !== 'AbortError') console.error('carga falhou', e);
+    if(seq === LOAD_SEQ){
+      el('status').textContent = anterior ? 'Falha ao atualizar os dados — exibindo a última versão carregada'
+                                          : 'Falha ao carregar os dados';
+      DATA = anterior; DATA_KEY = anteriorKey;
+      if(DATA) render();
+    }
+  } finally {
+    CARREGANDO--;
+    if(seq === LOAD_SEQ) document.body.classList.remove('loading');
+  }
+}
+
+function isSelected(a){ return SELECTED.size ? SELECTED.has(a) : true; }
+
+// Um mês do stream: cards por soma acumulada, gráficos com extendTraces, tabela só com as linhas novas
+function renderMes(rec, st){
+  const meses = DATA.meses;
+  if(!st.iniciado){
+    st.iniciado = true;
+    st.tot = {ativacoes:0, captacao:0, receita:0};
+    st.series = DATA.series.filter(isSelected);
+    const payload = { ativacoes: DATA.ativacoes, captacao: DATA.captacao, receita: DATA.receita };
+    for(const [metric, div] of Object.entries(CHART_DIVS)) plotMetric(metric, st.series, meses, payload, div);
+    buildDetailsTable([]);
+  } else {
+    const novos = DATA.series.filter(a => isSelected(a) && !st.series.includes(a));
+    const antigos = meses.slice(0, -1);
+    for(const [metric, div] of Object.entries(CHART_DIVS)){
+      if(novos.length) Plotly.addTraces(div, novos.map(a => makeTrace(metric, a, antigos, DATA[metric], st.series.length + novos.length)));
+    }
+    st.series = st.series.concat(novos);
+    const idx = st.series.map((_, i) => i);
+    for(const [metric, div] of Object.entries(CHART_DIVS)){
+      Plotly.extendTraces(div, { x: st.series.map(() => [rec.mes]), y: st.series.map(a => [rec[metric][a] || 0]) }, idx);
+      Plotly.relayout(div, {'xaxis.tickvals': meses, 'xaxis.ticktext': meses.map(m => MES_TICK[m] || m)});
+    }
+  }
+  for(const metric of Object.keys(st.tot)){
+    for(const [a, v] of Object.entries(rec[metric])) if(isSelected(a)) st.tot[metric] += v;
+  }
+  setCards(st.tot, null);
+  appendDetailRows(rec.detalhes.filter(d => isSelected(d.assessor)));
+}
+
+function render({tabela = true} = {}){
+  const series = DATA.series.filter(isSelected);
+  const meses = DATA.meses;
+
+  // Cards e Gráficos
+  updateMainCards();
+  const payload = { ativacoes: DATA.ativacoes, captacao: DATA.captacao, receita: DATA.receita };
+  for(const [metric, div] of Object.entries(CHART_DIVS)) plotMetric(metric, series, meses, payload, div);
+
+  // Tabela de DETALHES (linhas da AWS) - sem AAAA-MM
+  if(tabela) buildDetailsTable();
+
+  mountCSVLink();
+}
+
+(async function init(){
+  ALL_ASSESSORES = await fetchAssessores();
+  renderDropdown(''); renderChips(); await refresh();
+
+  el('assSearch').addEventListener('focus', () => renderDropdown(el('assSearch').value));
+  el('assSearch').addEventListener('input', (e)=> renderDropdown(e.target.value));
+  document.addEventListener('click', (e)=>{ const sel = el('assSel'); if(!sel.contains(e.target)) show(el('assDrop'), false); });
+  el('assSel').addEventListener('click', (e)=>{
+    const opt = e.target.closest('.opt');
+    if(opt && opt.dataset.value){
+      const v = opt.dataset.value;
+      if(SELECTED.has(v)) SELECTED.delete(v); else SELECTED.add(v);
+      renderDropdown(el('assSearch').value); renderChips(); refresh();
+    }
+  });
+
+  el('btnAll').addEventListener('click', ()=>{ ALL_ASSESSORES.forEach(a=>SELECTED.add(a)); renderDropdown(el('assSearch').value); renderChips(); refresh(); });
+  el('btnClear').addEventListener('click', ()=>{ SELECTED.clear(); renderDropdown(el('assSearch').value); renderChips(); refresh(); });
+
+  window.addEventListener('resize', () => Object.values(CHART_DIVS).forEach(div => Plotly.Plots.resize(div)));
+
+  el('segLine').addEventListener('click', ()=>{ CHART_MODE='line'; refresh(); });
+  el('segBar').addEventListener('click',  ()=>{ CHART_MODE='bar';  refresh(); });
+
+  // polling: pula se há carga em andamento; só re-renderiza se a versão mudou
+  setInterval(async ()=>{
+    if(document.hidden || !DATA || !DATA.versao || CARREGANDO) return;
+    const {seq, signal} = novaCarga();
+    CARREGANDO++;
+    try{
+      const antes = DATA.versao;
+      const {key, data} = await fetchPayload(undefined, signal);
+      if(seq !== LOAD_SEQ || key !== selectedKey()) return;
+      DATA = data; DATA_KEY = key;
+      if(DATA.versao !== antes) render();
+    } catch(e){
+      if(e.name !== 'AbortError') console.error('polling falhou', e);
+    } finally {
+      CARREGANDO--;
+    }
+  }, POLL_MS);
+})();